@@ -3,16 +3,23 @@ import logging
 import json
 import random
 import asyncio
+import fcntl
 import sqlite3
+import string
+
+import aiosqlite
+import orjson
 
 from datetime import time, datetime
+from time import monotonic
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, ORJSONResponse, Response
 from contextlib import asynccontextmanager
 from telegram import Update, Bot, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackContext, CallbackQueryHandler
 from telegram.error import Forbidden, NetworkError
+from telegram.request import HTTPXRequest
 
 
 # Cargar variables de entorno
@@ -34,68 +41,252 @@ CONFIG_FILE = 'config.json'
 FACTS_JSON_FILE = 'facts.json' # Renombrado para claridad
 DATABASE_FILE = 'facts.db'
 LOCK_FILE = 'bot.lock'
+DASHBOARD_TEMPLATE_FILE = 'dashboard.html'
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 WEBHOOK_URL = os.getenv("WEBHOOK_URL") # Revertido a usar la variable de entorno
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "my-secret-token")
 PORT = int(os.getenv("PORT", 8080))
+UPDATE_QUEUE_MAXSIZE = 2000 # Updates del webhook pendientes antes de responder 503
+UPDATE_DRAIN_TIMEOUT = 10.0 # Segundos que se espera al apagar para procesar los updates pendientes
+
+# Sentencias SQL como constantes: la misma cadena siempre reutiliza la sentencia preparada en caché
+SQL_CREATE_FACTS = "CREATE TABLE IF NOT EXISTS facts (id INTEGER PRIMARY KEY, fact_text TEXT NOT NULL UNIQUE)"
+SQL_COUNT_FACTS = "SELECT COUNT(*) FROM facts"
+SQL_ALL_FACTS = "SELECT fact_text FROM facts"
+SQL_INSERT_FACT = "INSERT OR IGNORE INTO facts (fact_text) VALUES (?)"
+
+# Plantillas de mensajes
+FACT_HEADER = "📚 **Curiosidad sobre C**\n\n"
+TEST_HEADER = "🧪 **Mensaje de prueba**\n\n"
+TEST_FOOTER = "\n\n_✅ Bot funcionando correctamente_"
+
+# Teclados: son inmutables, así que se construyen una sola vez
+MAIN_KEYBOARD_MARKUP = ReplyKeyboardMarkup([
+    [KeyboardButton("/status"), KeyboardButton("/addfact")],
+    [KeyboardButton("/listchats"), KeyboardButton("/config")],
+    [KeyboardButton("/stop"), KeyboardButton("/start")],
+], resize_keyboard=True, one_time_keyboard=False)
+CONFIG_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Ver Estado", callback_data='config_status')],
+    [InlineKeyboardButton("Añadir Curiosidad", callback_data='config_addfact')],
+    [InlineKeyboardButton("Gestionar Chats", callback_data='config_manage_chats')],
+    [InlineKeyboardButton("Detener Bot en este Chat", callback_data='config_stop')],
+    [InlineKeyboardButton("Activar Bot en este Chat", callback_data='config_start')],
+    [InlineKeyboardButton("Cerrar Menú", callback_data='config_close')],
+])
+MANAGE_CHATS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Listar Chats", callback_data='manage_chats_list')],
+    [InlineKeyboardButton("Añadir Chat Actual", callback_data='manage_chats_add_current')],
+    [InlineKeyboardButton("Eliminar Chat Actual", callback_data='manage_chats_remove_current')],
+    [InlineKeyboardButton("Volver al Menú Principal", callback_data='config_menu_main')],
+])
+
+# Segundos que se agrupan los cambios de configuración antes de escribir config.json
+CONFIG_SAVE_DEBOUNCE = 1.0
+
+# Segundos durante los que se reutiliza el HTML renderizado de /dashboard
+DASHBOARD_CACHE_TTL = 5.0
+
+# Plantilla del dashboard, cargada una sola vez al importar el módulo.
+# Los campos que no cambian durante la vida del proceso se sustituyen aquí mismo.
+with open(DASHBOARD_TEMPLATE_FILE, 'r', encoding='utf-8') as f:
+    _DASHBOARD_TMPL = string.Template(string.Template(f.read()).safe_substitute(
+        webhook='🟢 CONFIGURADO' if WEBHOOK_URL else '🔴 NO CONFIGURADO'
+    ))
 
 # Variable global para la aplicación de Telegram
 telegram_app = None
 
+# Respuesta de /health pre-serializada; la refresca cada segundo _tick_health
+_health_bytes = orjson.dumps({"status": "healthy", "timestamp": datetime.now().isoformat()})
+health_task = None
+
+class _TokenBucket:
+    """Token bucket simple: `acquire` espera hasta que haya un token disponible"""
+    def __init__(self, max_tokens, refill_per_sec):
+        self.max_tokens = max_tokens
+        self.refill_per_sec = refill_per_sec
+        self.tokens = float(max_tokens)
+        self._last_refill = monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._last_refill) * self.refill_per_sec)
+        self._last_refill = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.refill_per_sec)
+                self._refill()
+            self.tokens -= 1
+
+class TelegramRateLimiter:
+    """Limita los envíos a los topes de Telegram: ~30 msg/s globales y 20 msg/min por grupo"""
+    def __init__(self, max_tokens=28, refill_per_sec=28 / 1.0, chat_max_tokens=20, chat_refill_per_sec=20 / 60.0):
+        self._global = _TokenBucket(max_tokens, refill_per_sec)
+        self._chat_max_tokens = chat_max_tokens
+        self._chat_refill_per_sec = chat_refill_per_sec
+        self._chats: dict[int, _TokenBucket] = {}
+
+    async def acquire(self, chat_id):
+        # Primero el cupo del chat, para no retener el cupo global mientras se espera por un solo chat
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = _TokenBucket(self._chat_max_tokens, self._chat_refill_per_sec)
+        await bucket.acquire()
+        await self._global.acquire()
+
 class BotManager:
     def __init__(self):
         self.config = self._load_config()
-        self._init_db()
+        # Set para pertenencia/altas/bajas en O(1); se guarda como lista en config.json
+        self.chat_ids: set[int] = set(self.config['configured_chat_ids'])
+        self._limiter = TelegramRateLimiter()
+        self._dashboard_html: tuple[float, str] | None = None # (monotonic, html)
+        self._status_payload: dict | None = None # Respuesta de /status
+        self.db: aiosqlite.Connection | None = None # Conexión persistente, abierta en open_db
+        self._db_write_lock = asyncio.Lock()
+        self._config_dirty = False
+        self._flush_task: asyncio.Task | None = None
+        self._daily_jobs = [] # Jobs devueltos por run_daily, para eliminarlos sin recorrer la cola
+        # callback_data -> handler, para no recorrer una cadena de if/elif en cada pulsación
+        self._callback_dispatch = {
+            'config_status': self.status_command,
+            'config_addfact': self._callback_addfact_help,
+            'config_manage_chats': self.manage_chats_menu,
+            'config_stop': self.stop_command,
+            'config_start': self.start_command,
+            'config_close': self._callback_close,
+            'config_menu_main': self.config_menu,
+            'manage_chats_list': self.list_chats_command,
+            'manage_chats_add_current': self._callback_add_current_chat,
+            'manage_chats_remove_current': self._callback_remove_current_chat,
+        }
         
     def _load_config(self):
         try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
-                # Asegurar que configured_chat_ids sea una lista
-                if 'configured_chat_ids' not in config_data or not isinstance(config_data['configured_chat_ids'], list):
-                    config_data['configured_chat_ids'] = []
-                return config_data
+            with open(CONFIG_FILE, 'rb') as f:
+                config_data = orjson.loads(f.read())
+            # Asegurar que configured_chat_ids sea una lista
+            if 'configured_chat_ids' not in config_data or not isinstance(config_data['configured_chat_ids'], list):
+                config_data['configured_chat_ids'] = []
+            return config_data
         except (FileNotFoundError, json.JSONDecodeError):
             return {'configured_chat_ids': []}
     
-    def _save_config(self):
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.config, f, indent=4, ensure_ascii=False)
-
-    def _get_db_connection(self):
-        conn = sqlite3.connect(DATABASE_FILE)
-        conn.row_factory = sqlite3.Row # Permite acceder a las columnas por nombre
-        return conn
-
-    def _init_db(self):
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("CREATE TABLE IF NOT EXISTS facts (id INTEGER PRIMARY KEY, fact_text TEXT NOT NULL UNIQUE)")
-        conn.commit()
-
-        # Migrar datos de facts.json si existen y la DB está vacía
-        cursor.execute("SELECT COUNT(*) FROM facts")
-        db_fact_count = cursor.fetchone()[0]
-
-        if db_fact_count == 0 and os.path.exists(FACTS_JSON_FILE):
-            logger.info(f"Migrando curiosidades de {FACTS_JSON_FILE} a la base de datos.")
+    def _mark_dirty(self):
+        """Programa la escritura de config.json; los cambios seguidos se agrupan en una sola escritura"""
+        self._config_dirty = True
+        self._invalidate_caches()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_config_later())
+
+    async def _flush_config_later(self):
+        await asyncio.sleep(CONFIG_SAVE_DEBOUNCE)
+        await self._write_pending_config()
+
+    async def _write_pending_config(self):
+        # Si hay cambios mientras se escribe, se vuelve a escribir
+        while self._config_dirty:
+            self._config_dirty = False
+            self.config['configured_chat_ids'] = sorted(self.chat_ids)
+            data = orjson.dumps(self.config, option=orjson.OPT_APPEND_NEWLINE) # JSON compacto: lo escribe y lee el bot
             try:
-                with open(FACTS_JSON_FILE, 'r', encoding='utf-8') as f:
-                    json_data = json.load(f)
+                await asyncio.to_thread(self._write_config, data)
+            except OSError as e:
+                logger.error("Error al guardar %s: %s", CONFIG_FILE, e)
+                self._config_dirty = True # Se reintenta en la próxima escritura
+                return
+
+    def _write_config(self, data: bytes):
+        # Escritura atómica: nunca queda un config.json a medio escribir
+        tmp_file = f"{CONFIG_FILE}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, CONFIG_FILE)
+
+    async def flush_config(self):
+        """Escribe los cambios pendientes (se usa al apagar); nunca propaga errores"""
+        try:
+            if self._flush_task is not None:
+                await self._flush_task
+            # Reintentar si la última escritura falló
+            await self._write_pending_config()
+        except Exception:
+            logger.exception("Error al guardar la configuración pendiente")
+
+    def _invalidate_caches(self):
+        """Descarta las respuestas renderizadas tras un cambio de configuración o de curiosidades"""
+        self._dashboard_html = None
+        self._status_payload = None
+
+    async def open_db(self):
+        """Abre la conexión persistente a la base de datos e inicializa el esquema"""
+        self.db = await aiosqlite.connect(DATABASE_FILE, isolation_level=None, cached_statements=128)
+        self.db.row_factory = sqlite3.Row # Permite acceder a las columnas por nombre
+        try:
+            # Una sola conexión por proceso, así que los PRAGMA se aplican una única vez
+            await self.db.execute("PRAGMA journal_mode=WAL")
+            await self.db.execute("PRAGMA synchronous=NORMAL")
+            await self.db.execute("PRAGMA temp_store=MEMORY")
+            await self.db.execute("PRAGMA cache_size=-20000") # ~20 MB de caché de páginas
+            await self.db.execute("PRAGMA mmap_size=134217728") # 128 MB mapeados en memoria
+            await self._init_db()
+        except BaseException:
+            # El hilo de aiosqlite no es daemon: si no se cierra aquí, el proceso no termina
+            await self.close_db()
+            raise
+
+    async def close_db(self):
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+
+    @staticmethod
+    def _read_facts_json():
+        with open(FACTS_JSON_FILE, 'rb') as f:
+            return orjson.loads(f.read())
+
+    async def _init_db(self):
+        await self.db.execute(SQL_CREATE_FACTS)
+
+        # Migrar datos de facts.json si existen y la DB está vacía.
+        # Sin archivo (el caso habitual tras la migración) no hace falta contar filas.
+        db_fact_count = None
+        if os.path.exists(FACTS_JSON_FILE):
+            async with self.db.execute(SQL_COUNT_FACTS) as cursor:
+                db_fact_count = (await cursor.fetchone())[0]
+
+        if db_fact_count == 0:
+            logger.info("Migrando curiosidades de %s a la base de datos.", FACTS_JSON_FILE)
+            try:
+                json_data = await asyncio.to_thread(self._read_facts_json)
                 facts_to_migrate = json_data.get('facts', [])
                 
-                for fact in facts_to_migrate:
-                    try:
-                        cursor.execute("INSERT INTO facts (fact_text) VALUES (?) ", (fact,))
-                    except sqlite3.IntegrityError: # Manejar duplicados si los hubiera
-                        logger.warning(f"Curiosidad duplicada no insertada: {fact[:50]}...")
-                conn.commit()
-                logger.info(f"Migración completada. {len(facts_to_migrate)} curiosidades migradas.")
-                os.remove(FACTS_JSON_FILE) # Eliminar el archivo JSON después de la migración
-                logger.info(f"Archivo {FACTS_JSON_FILE} eliminado.")
+                await self.db.execute("BEGIN")
+                # INSERT OR IGNORE descarta los duplicados sin lanzar IntegrityError
+                cursor = await self.db.executemany(SQL_INSERT_FACT, [(fact,) for fact in facts_to_migrate])
+                await self.db.commit()
+                skipped_count = len(facts_to_migrate) - cursor.rowcount
+                if skipped_count > 0:
+                    logger.warning("%s curiosidades duplicadas no insertadas.", skipped_count)
+                logger.info("Migración completada. %s curiosidades migradas.", cursor.rowcount)
+                await self.db.execute("ANALYZE") # Estadísticas para el planificador tras la carga inicial
+                await asyncio.to_thread(os.remove, FACTS_JSON_FILE) # Eliminar el archivo JSON después de la migración
+                logger.info("Archivo %s eliminado.", FACTS_JSON_FILE)
             except (FileNotFoundError, json.JSONDecodeError) as e:
-                logger.error(f"Error al migrar {FACTS_JSON_FILE}: {e}")
-        conn.close()
+                logger.error("Error al migrar %s: %s", FACTS_JSON_FILE, e)
+
+        await self._load_facts()
+
+    async def _load_facts(self):
+        """Mantiene las curiosidades en memoria para elegir una sin consultar la DB"""
+        async with self.db.execute(SQL_ALL_FACTS) as cursor:
+            self._facts = [row['fact_text'] for row in await cursor.fetchall()]
+        self._facts_set = set(self._facts) # Detección de duplicados en O(1)
 
     async def is_user_admin(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
         owner_id = self.config.get('owner_id')
@@ -106,44 +297,49 @@ class BotManager:
         return update.effective_user.id == owner_id
 
     async def send_fact(self, context: CallbackContext):
-        configured_chat_ids = self.config.get('configured_chat_ids', [])
+        configured_chat_ids = list(self.chat_ids) # Copia: el set puede cambiar durante los envíos
         if not configured_chat_ids:
             logger.warning("Job ejecutado pero no hay chat_id configurado en configured_chat_ids.")
             return
 
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT fact_text FROM facts ORDER BY RANDOM() LIMIT 1")
-        fact_row = cursor.fetchone()
-        conn.close()
-
-        if not fact_row:
+        if not self._facts:
             logger.warning("No se encontraron curiosidades en la base de datos.")
             # Consider sending a message to active_chat_id if no facts are available
             return
 
-        fact = fact_row['fact_text']
+        fact = random.choice(self._facts)
+        # El pie con la hora se construye al programar el job, no en cada envío
+        text = FACT_HEADER + fact + context.job.data['footer']
         
-        for chat_id in configured_chat_ids:
-            try:
-                await context.bot.send_message(
-                    chat_id=chat_id, 
-                    text=f"📚 **Curiosidad sobre C**\n\n{fact}\n\n_🕐 {datetime.now().strftime('%H:%M')}_",
-                    parse_mode='Markdown'
-                )
-                logger.info(f"Curiosidad enviada al chat {chat_id}")
-            except Forbidden:
-                logger.error(f"Error: Bot bloqueado en el chat {chat_id}. Eliminando de la lista.")
-                self.config['configured_chat_ids'].remove(chat_id)
-                self._save_config()
-            except Exception as e:
-                logger.error(f"Error al enviar mensaje al chat {chat_id}: {e}")
+        # Enviar a todos los chats en paralelo y retirar los que bloquearon al bot en una sola pasada
+        results = await asyncio.gather(*(self._send_one(context.bot, chat_id, text) for chat_id in configured_chat_ids))
+        blocked_chat_ids = {chat_id for chat_id in results if chat_id is not None}
+        if blocked_chat_ids:
+            self.chat_ids -= blocked_chat_ids
+            self._mark_dirty()
+
+    async def _send_one(self, bot: Bot, chat_id: int, text: str):
+        """Envía una curiosidad a un chat; devuelve el chat_id si el bot fue bloqueado en él"""
+        try:
+            await self._limiter.acquire(chat_id)
+            await bot.send_message(
+                chat_id=chat_id, 
+                text=text,
+                parse_mode='Markdown'
+            )
+            logger.info("Curiosidad enviada al chat %s", chat_id)
+        except Forbidden:
+            logger.error("Error: Bot bloqueado en el chat %s. Eliminando de la lista.", chat_id)
+            return chat_id
+        except Exception as e:
+            logger.error("Error al enviar mensaje al chat %s: %s", chat_id, e)
+        return None
 
     async def remove_all_jobs(self, application: Application):
         """Elimina todos los jobs programados"""
-        for job in application.job_queue.jobs():
-            if job.name and job.name.startswith("daily_fact_"):
-                job.schedule_removal()
+        for job in self._daily_jobs:
+            job.schedule_removal()
+        self._daily_jobs = []
 
     async def setup_daily_jobs(self, application: Application):
         """Configura los jobs diarios"""
@@ -161,21 +357,18 @@ class BotManager:
             time(hour=6, minute=0)    # 6:00 AM
         ]
         
-        for i, t in enumerate(times, 1):
+        self._daily_jobs = [
             application.job_queue.run_daily(
                 self.send_fact, 
                 time=t, 
-                name=f"daily_fact_{i}"
+                name=f"daily_fact_{i}",
+                data={'footer': f"\n\n_🕐 {t.strftime('%H:%M')}_"}
             )
+            for i, t in enumerate(times, 1)
+        ]
 
     async def set_main_keyboard(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        keyboard = [
-            [KeyboardButton("/status"), KeyboardButton("/addfact")],
-            [KeyboardButton("/listchats"), KeyboardButton("/config")],
-            [KeyboardButton("/stop"), KeyboardButton("/start")],
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
-        await update.message.reply_text("Aquí tienes el teclado principal del bot.", reply_markup=reply_markup)
+        await update.message.reply_text("Aquí tienes el teclado principal del bot.", reply_markup=MAIN_KEYBOARD_MARKUP)
 
     async def remove_main_keyboard(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup = ReplyKeyboardRemove()
@@ -190,8 +383,8 @@ class BotManager:
         # If owner_id is not set, the current user becomes the owner
         if not is_owner_already_set:
             self.config['owner_id'] = user_id
-            self._save_config() # Save immediately so other checks work
-            logger.info(f"Owner ID set to {user_id}")
+            self._mark_dirty() # Checks below read the in-memory config
+            logger.info("Owner ID set to %s", user_id)
         
         # Now, check if the current user is the owner (either newly set or existing)
         if not await self.is_user_admin(update, context):
@@ -199,13 +392,13 @@ class BotManager:
             return
 
         # Add current chat to configured_chat_ids if not already there
-        if chat_id not in self.config['configured_chat_ids']:
-            self.config['configured_chat_ids'].append(chat_id)
+        if chat_id not in self.chat_ids:
+            self.chat_ids.add(chat_id)
             await update.message.reply_text(f"✅ Este chat ({chat_id}) ha sido añadido a la lista de publicación.")
         
         self.config['active_chat_id'] = chat_id # Set current chat as active
         self.config['setup_date'] = datetime.now().isoformat()
-        self._save_config()
+        self._mark_dirty()
 
         await self.setup_daily_jobs(context.application)
 
@@ -216,7 +409,7 @@ class BotManager:
             "❌ Usa /stop para detener el bot.",
             parse_mode='Markdown'
         )
-        logger.info(f"Bot configurado por propietario {user_id} en chat {chat_id}")
+        logger.info("Bot configurado por propietario %s en chat %s", user_id, chat_id)
         await self.set_main_keyboard(update, context) # Show main keyboard on start
 
     async def stop_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -226,17 +419,17 @@ class BotManager:
 
         chat_id = update.effective_chat.id
         
-        if chat_id in self.config['configured_chat_ids']:
-            self.config['configured_chat_ids'].remove(chat_id)
+        if chat_id in self.chat_ids:
+            self.chat_ids.remove(chat_id)
             await update.message.reply_text(f"🛑 Este chat ({chat_id}) ha sido eliminado de la lista de publicación.")
         
         if self.config.get('active_chat_id') == chat_id:
             self.config.pop('active_chat_id', None)
 
-        self._save_config()
+        self._mark_dirty()
 
         # Si no quedan chats configurados, detener los jobs
-        if not self.config['configured_chat_ids']:
+        if not self.chat_ids:
             await self.remove_all_jobs(context.application)
             await update.message.reply_text(
                 "🛑 **Bot detenido completamente!**\n\n" 
@@ -244,7 +437,7 @@ class BotManager:
                 "🚀 Usa /start en un chat para reactivar cuando quieras.",
                 parse_mode='Markdown'
             )
-            logger.info(f"Bot detenido completamente por propietario {update.effective_user.id}")
+            logger.info("Bot detenido completamente por propietario %s", update.effective_user.id)
             await self.remove_main_keyboard(update, context) # Remove main keyboard on full stop
         else:
             await update.message.reply_text(
@@ -253,7 +446,7 @@ class BotManager:
                 "🚀 Usa /start en este chat para reactivar cuando quieras.",
                 parse_mode='Markdown'
             )
-            logger.info(f"Bot detenido en chat {chat_id} por propietario {update.effective_user.id}")
+            logger.info("Bot detenido en chat %s por propietario %s", chat_id, update.effective_user.id)
 
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not await self.is_user_admin(update, context):
@@ -261,19 +454,15 @@ class BotManager:
             return
 
         chat_id = update.effective_chat.id
-        is_active_in_this_chat = chat_id in self.config.get('configured_chat_ids', [])
+        is_active_in_this_chat = chat_id in self.chat_ids
         
         status_text = "✅ **ACTIVO**" if is_active_in_this_chat else "❌ **INACTIVO**"
         setup_date = self.config.get('setup_date', 'No configurado')
         owner_id = self.config.get('owner_id', 'No configurado')
 
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM facts")
-        total_facts = cursor.fetchone()[0]
-        conn.close()
+        total_facts = len(self._facts)
         
-        configured_chats_str = ", ".join(map(str, self.config.get('configured_chat_ids', []))) if self.config.get('configured_chat_ids') else "Ninguno"
+        configured_chats_str = ", ".join(map(str, sorted(self.chat_ids))) if self.chat_ids else "Ninguno"
 
         await update.message.reply_text(
             f"""
@@ -312,21 +501,37 @@ class BotManager:
             if not facts_to_add:
                 raise IndexError # No valid facts found after splitting
 
-            conn = self._get_db_connection()
-            cursor = conn.cursor()
             added_count = 0
-            skipped_count = 0
-
-            for fact_text in facts_to_add:
-                try:
-                    cursor.execute("INSERT INTO facts (fact_text) VALUES (?) ", (fact_text,))
-                    conn.commit()
-                    added_count += 1
-                except sqlite3.IntegrityError:
-                    skipped_count += 1
-                    logger.warning(f"Curiosidad duplicada no insertada: {fact_text[:50]}...")
+            new_facts = []
+
+            async with self._db_write_lock:
+                for fact_text in facts_to_add:
+                    if fact_text in self._facts_set:
+                        logger.warning("Curiosidad duplicada no insertada: %s...", fact_text[:50])
+                        continue
+                    self._facts_set.add(fact_text) # También descarta repeticiones dentro del mismo lote
+                    new_facts.append(fact_text)
+
+                if new_facts:
+                    # Una sola transacción para todo el lote
+                    try:
+                        await self.db.execute("BEGIN")
+                        cursor = await self.db.executemany(SQL_INSERT_FACT, [(f,) for f in new_facts])
+                        await self.db.commit()
+                    except sqlite3.Error:
+                        await self.db.rollback()
+                        self._facts_set.difference_update(new_facts)
+                        raise
+                    # INSERT OR IGNORE: rowcount solo cuenta las filas realmente insertadas
+                    added_count = cursor.rowcount
+                    if added_count == len(new_facts):
+                        self._facts.extend(new_facts)
+                    else:
+                        await self._load_facts() # La DB ya tenía alguna; resincronizar la caché
+            skipped_count = len(facts_to_add) - added_count
             
-            conn.close()
+            if added_count > 0:
+                self._invalidate_caches()
 
             response_message = f"✅ ¡Operación completada!\n"
             if added_count > 0:
@@ -335,12 +540,12 @@ class BotManager:
                 response_message += f"Se omitieron {skipped_count} curiosidades (ya existían).\n"
             
             await update.message.reply_text(response_message)
-            logger.info(f"Curiosidades añadidas por {update.effective_user.id}: {added_count} nuevas, {skipped_count} omitidas.")
+            logger.info("Curiosidades añadidas por %s: %s nuevas, %s omitidas.", update.effective_user.id, added_count, skipped_count)
 
         except IndexError:
             await update.message.reply_text("⚠️ Por favor, proporciona una o varias curiosidades después del comando.\nSepara cada curiosidad con `---`.\nEjemplo: `/addfact Curiosidad 1 --- Curiosidad 2 --- Curiosidad 3`", parse_mode='Markdown')
         except Exception as e:
-            logger.error(f"Error en addfact_command: {e}")
+            logger.error("Error en addfact_command: %s", e)
             await update.message.reply_text("❌ Ocurrió un error al añadir la curiosidad.")
 
     async def list_chats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -348,19 +553,18 @@ class BotManager:
             await update.message.reply_text("❌ Solo el propietario del bot puede listar los chats.")
             return
         
-        configured_chat_ids = self.config.get('configured_chat_ids', [])
-        if not configured_chat_ids:
+        if not self.chat_ids:
             await update.message.reply_text("No hay chats configurados para la publicación.")
             return
         
         chat_list_str = "Chats configurados para publicación:\n"
-        for chat_id in configured_chat_ids:
+        for chat_id in sorted(self.chat_ids):
             chat_list_str += f"- `{chat_id}`\n"
         
         await update.message.reply_text(chat_list_str, parse_mode='Markdown')
 
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        logger.error(f"Error: {context.error}", exc_info=context.error)
+        logger.error("Error: %s", context.error, exc_info=context.error)
         
         if update and update.effective_message:
             await update.effective_message.reply_text(
@@ -372,30 +576,14 @@ class BotManager:
             await update.message.reply_text("❌ Solo el propietario del bot puede acceder al menú de configuración.")
             return
 
-        keyboard = [
-            [InlineKeyboardButton("Ver Estado", callback_data='config_status')],
-            [InlineKeyboardButton("Añadir Curiosidad", callback_data='config_addfact')],
-            [InlineKeyboardButton("Gestionar Chats", callback_data='config_manage_chats')],
-            [InlineKeyboardButton("Detener Bot en este Chat", callback_data='config_stop')],
-            [InlineKeyboardButton("Activar Bot en este Chat", callback_data='config_start')],
-            [InlineKeyboardButton("Cerrar Menú", callback_data='config_close')],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text('Menú de Configuración:', reply_markup=reply_markup)
+        await update.message.reply_text('Menú de Configuración:', reply_markup=CONFIG_MENU_MARKUP)
 
     async def manage_chats_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not await self.is_user_admin(update, context):
             await update.message.reply_text("❌ Solo el propietario del bot puede gestionar chats.")
             return
 
-        keyboard = [
-            [InlineKeyboardButton("Listar Chats", callback_data='manage_chats_list')],
-            [InlineKeyboardButton("Añadir Chat Actual", callback_data='manage_chats_add_current')],
-            [InlineKeyboardButton("Eliminar Chat Actual", callback_data='manage_chats_remove_current')],
-            [InlineKeyboardButton("Volver al Menú Principal", callback_data='config_menu_main')],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text('Menú de Gestión de Chats:', reply_markup=reply_markup)
+        await update.message.reply_text('Menú de Gestión de Chats:', reply_markup=MANAGE_CHATS_MARKUP)
 
     async def callback_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
@@ -405,49 +593,49 @@ class BotManager:
             await query.edit_message_text("❌ No tienes permiso para realizar esta acción.")
             return
 
-        action = query.data
+        handler = self._callback_dispatch.get(query.data)
+        if handler:
+            await handler(update, context)
+
+    async def _callback_addfact_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.edit_message_text("Para añadir una curiosidad, usa el comando: `/addfact [tu curiosidad aquí]`\nSepara múltiples curiosidades con `---`.", parse_mode='Markdown')
+
+    async def _callback_close(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.edit_message_text("Menú cerrado.")
+
+    async def _callback_add_current_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
         chat_id = update.effective_chat.id
+        chat_ids = self.chat_ids
+        if chat_id not in chat_ids:
+            chat_ids.add(chat_id)
+            self._mark_dirty()
+            await query.edit_message_text(f"✅ Este chat ({chat_id}) ha sido añadido a la lista de publicación.")
+        else:
+            await query.edit_message_text(f"ℹ️ Este chat ({chat_id}) ya está en la lista de publicación.")
 
-        if action == 'config_status':
-            await self.status_command(update, context)
-        elif action == 'config_addfact':
-            await query.edit_message_text("Para añadir una curiosidad, usa el comando: `/addfact [tu curiosidad aquí]`\nSepara múltiples curiosidades con `---`.", parse_mode='Markdown')
-        elif action == 'config_manage_chats':
-            await self.manage_chats_menu(update, context)
-        elif action == 'config_stop':
-            await self.stop_command(update, context)
-        elif action == 'config_start':
-            await self.start_command(update, context)
-        elif action == 'config_close':
-            await query.edit_message_text("Menú cerrado.")
-        elif action == 'manage_chats_list':
-            await self.list_chats_command(update, context)
-        elif action == 'manage_chats_add_current':
-            if chat_id not in self.config['configured_chat_ids']:
-                self.config['configured_chat_ids'].append(chat_id)
-                self._save_config()
-                await query.edit_message_text(f"✅ Este chat ({chat_id}) ha sido añadido a la lista de publicación.")
-            else:
-                await query.edit_message_text(f"ℹ️ Este chat ({chat_id}) ya está en la lista de publicación.")
-        elif action == 'manage_chats_remove_current':
-            if chat_id in self.config['configured_chat_ids']:
-                self.config['configured_chat_ids'].remove(chat_id)
-                self._save_config()
-                await query.edit_message_text(f"🛑 Este chat ({chat_id}) ha sido eliminado de la lista de publicación.")
-                # Si el chat eliminado era el activo, desconfigurarlo
-                if self.config.get('active_chat_id') == chat_id:
-                    self.config.pop('active_chat_id', None)
-                    self._save_config()
-            else:
-                await query.edit_message_text(f"ℹ️ Este chat ({chat_id}) no está en la lista de publicación.")
-        elif action == 'config_menu_main':
-            await self.config_menu(update, context)
+    async def _callback_remove_current_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        chat_id = update.effective_chat.id
+        chat_ids = self.chat_ids
+        if chat_id in chat_ids:
+            chat_ids.remove(chat_id)
+            # Si el chat eliminado era el activo, desconfigurarlo
+            if self.config.get('active_chat_id') == chat_id:
+                self.config.pop('active_chat_id', None)
+            self._mark_dirty()
+            await query.edit_message_text(f"🛑 Este chat ({chat_id}) ha sido eliminado de la lista de publicación.")
+        else:
+            await query.edit_message_text(f"ℹ️ Este chat ({chat_id}) no está en la lista de publicación.")
 
 async def _setup_telegram_app(app_instance: Application, bot_manager_instance: BotManager):
     if WEBHOOK_URL:
-        logger.info(f"Configurando webhook: {WEBHOOK_URL}/webhook")
-        logger.info(f"Valor de WEBHOOK_URL: {WEBHOOK_URL}")
-        logger.info(f"Valor de TELEGRAM_TOKEN (primeros 5 chars): {TELEGRAM_TOKEN[:5] if TELEGRAM_TOKEN else 'N/A'}")
+        logger.info("Configurando webhook: %s/webhook", WEBHOOK_URL)
+        logger.info("Valor de WEBHOOK_URL: %s", WEBHOOK_URL)
+        logger.info("Valor de TELEGRAM_TOKEN (primeros 5 chars): %s", TELEGRAM_TOKEN[:5] if TELEGRAM_TOKEN else 'N/A')
+        # process_update exige una aplicación inicializada; start() además arranca el JobQueue
+        await app_instance.initialize()
+        await app_instance.start()
         try:
             await app_instance.bot.set_webhook(
                 url=f"{WEBHOOK_URL}/webhook",
@@ -455,7 +643,7 @@ async def _setup_telegram_app(app_instance: Application, bot_manager_instance: B
             )
             logger.info("Webhook configurado exitosamente.")
         except Exception as e:
-            logger.critical(f"Error al configurar webhook: {e}")
+            logger.critical("Error al configurar webhook: %s", e)
             raise HTTPException(status_code=500, detail=f"Error al configurar webhook: {e}")
     else:
         logger.info("Modo polling activado (sin webhook")
@@ -465,49 +653,109 @@ async def _setup_telegram_app(app_instance: Application, bot_manager_instance: B
 # Lifespan events para FastAPI
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    if os.path.exists(LOCK_FILE):
-        logger.error("Lock file exists. Another instance is likely running. Exiting.")
-        raise RuntimeError("Lock file exists, exiting.")
-    
-    with open(LOCK_FILE, "w") as f:
-        f.write(str(os.getpid()))
+    # Lock exclusivo a nivel de SO: es atómico y el kernel lo libera si el proceso muere
+    lock_file = open(LOCK_FILE, "a+")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        logger.error("Lock file is held. Another instance is likely running. Exiting.")
+        raise RuntimeError("Lock file is held, exiting.")
 
-    # Startup
-    global telegram_app
-    logger.info("Iniciando aplicación FastAPI + Telegram Bot...")
-    
-    if not TELEGRAM_TOKEN:
-        logger.critical("No se encontró TELEGRAM_TOKEN")
-        raise HTTPException(status_code=500, detail="Token de Telegram no configurado")
-    
-    # Crear aplicación de Telegram
-    telegram_app = Application.builder().token(TELEGRAM_TOKEN).build()
-    bot_manager = BotManager()
-    
-    # Añadir handlers
-    telegram_app.add_handler(CommandHandler("start", bot_manager.start_command))
-    telegram_app.add_handler(CommandHandler("stop", bot_manager.stop_command))
-    telegram_app.add_handler(CommandHandler("status", bot_manager.status_command))
-    telegram_app.add_handler(CommandHandler("addfact", bot_manager.addfact_command))
-    telegram_app.add_handler(CommandHandler("listchats", bot_manager.list_chats_command)) # Nuevo handler
-    telegram_app.add_handler(CommandHandler("config", bot_manager.config_menu)) 
-    telegram_app.add_handler(CallbackQueryHandler(bot_manager.callback_handler)) 
-    telegram_app.add_error_handler(bot_manager.error_handler)
-    
-    # Configurar webhook o polling
-    await _setup_telegram_app(telegram_app, bot_manager)
-    
-    yield
-    
-    # Shutdown
-    logger.info("Apagando aplicación...")
-    if telegram_app:
-        if WEBHOOK_URL:
-            await telegram_app.bot.delete_webhook()
-        await telegram_app.shutdown()
+    lock_file.truncate(0)
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
 
-    if os.path.exists(LOCK_FILE):
-        os.remove(LOCK_FILE)
+    try:
+        # Startup
+        global telegram_app, health_task
+        health_task = None
+        logger.info("Iniciando aplicación FastAPI + Telegram Bot...")
+        
+        if not TELEGRAM_TOKEN:
+            logger.critical("No se encontró TELEGRAM_TOKEN")
+            raise HTTPException(status_code=500, detail="Token de Telegram no configurado")
+        
+        # Crear aplicación de Telegram
+        telegram_app = (
+            Application.builder()
+            .token(TELEGRAM_TOKEN)
+            .concurrent_updates(256) # Procesar updates en paralelo en lugar de uno a uno
+            # Cola acotada: el webhook encola aquí y responde 503 cuando está llena
+            .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_MAXSIZE))
+            # HTTP/2: todas las llamadas a la API de Telegram comparten una conexión multiplexada
+            .request(HTTPXRequest(
+                connection_pool_size=64,
+                pool_timeout=30,
+                connect_timeout=10,
+                read_timeout=20,
+                http_version="2"
+            ))
+            .get_updates_request(HTTPXRequest(connection_pool_size=8)) # Solo se usa en modo polling
+            .build()
+        )
+        # Única instancia, compartida por los handlers y los endpoints HTTP
+        bot_manager = BotManager()
+        await bot_manager.open_db()
+        # El hilo de aiosqlite no es daemon: desde aquí la conexión se cierra siempre, o el proceso no termina
+        try:
+            app.state.bot_manager = bot_manager
+            
+            # Añadir handlers
+            telegram_app.add_handler(CommandHandler("start", bot_manager.start_command))
+            telegram_app.add_handler(CommandHandler("stop", bot_manager.stop_command))
+            telegram_app.add_handler(CommandHandler("status", bot_manager.status_command))
+            telegram_app.add_handler(CommandHandler("addfact", bot_manager.addfact_command))
+            telegram_app.add_handler(CommandHandler("listchats", bot_manager.list_chats_command)) # Nuevo handler
+            telegram_app.add_handler(CommandHandler("config", bot_manager.config_menu)) 
+            telegram_app.add_handler(CallbackQueryHandler(bot_manager.callback_handler)) 
+            telegram_app.add_error_handler(bot_manager.error_handler)
+
+            health_task = asyncio.create_task(_tick_health())
+            
+            # Configurar webhook o polling
+            await _setup_telegram_app(telegram_app, bot_manager)
+            
+            yield
+            
+            # Shutdown
+            logger.info("Apagando aplicación...")
+        finally:
+            if health_task is not None:
+                health_task.cancel()
+                await asyncio.gather(health_task, return_exceptions=True)
+
+            # Un fallo al desmontar Telegram no debe impedir guardar la configuración ni cerrar la DB
+            try:
+                if WEBHOOK_URL:
+                    await telegram_app.bot.delete_webhook()
+                # En modo polling run_polling dejó la aplicación en marcha; shutdown() exige detenerla antes
+                if telegram_app.updater and telegram_app.updater.running:
+                    await telegram_app.updater.stop()
+                if telegram_app.running:
+                    # Telegram ya recibió un 200 por cada update encolado y no los reenviará:
+                    # stop() los procesa antes de detenerse
+                    try:
+                        await asyncio.wait_for(telegram_app.stop(), timeout=UPDATE_DRAIN_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        logger.warning("Tiempo agotado esperando a que terminen los updates pendientes")
+                await telegram_app.shutdown()
+            except Exception:
+                logger.exception("Error al detener la aplicación de Telegram")
+
+            await bot_manager.flush_config()
+            await bot_manager.close_db()
+    finally:
+        # No se borra el archivo: otra instancia podría estar esperando el lock sobre él
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+async def _tick_health():
+    """Regenera la respuesta de /health una vez por segundo"""
+    global _health_bytes
+    while True:
+        _health_bytes = orjson.dumps({"status": "healthy", "timestamp": datetime.now().isoformat()})
+        await asyncio.sleep(1)
 
 async def run_polling():
     """Ejecutar polling en segundo plano si no hay webhook"""
@@ -522,12 +770,10 @@ app = FastAPI(
     title="Telegram Bot API",
     description="API para gestionar el bot de curiosidades de C",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
-# Instancia del bot manager
-bot_manager = BotManager()
-
 # Rutas de la API
 @app.get("/")
 async def root():
@@ -535,27 +781,28 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return Response(content=_health_bytes, media_type="application/json")
 
 @app.get("/status")
-async def get_status():
-    config = bot_manager._load_config()
+async def get_status(request: Request):
+    bot_manager: BotManager = request.app.state.bot_manager
+    if bot_manager._status_payload is not None:
+        return bot_manager._status_payload
+
+    config = bot_manager.config
     
-    conn = bot_manager._get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM facts")
-    total_facts = cursor.fetchone()[0]
-    conn.close()
+    total_facts = len(bot_manager._facts)
 
-    return {
+    bot_manager._status_payload = {
         "active": bool(config.get('active_chat_id')),
         "owner_id": config.get('owner_id'),
         "active_chat_id": config.get('active_chat_id'),
-        "configured_chat_ids": config.get('configured_chat_ids', []),
+        "configured_chat_ids": sorted(bot_manager.chat_ids),
         "setup_date": config.get('setup_date'),
         "total_facts": total_facts,
         "webhook_configured": bool(WEBHOOK_URL)
     }
+    return bot_manager._status_payload
 
 @app.post("/webhook")
 async def telegram_webhook(request: Request):
@@ -567,96 +814,75 @@ async def telegram_webhook(request: Request):
             raise HTTPException(status_code=403, detail="No autorizado")
     
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         update = Update.de_json(data, telegram_app.bot)
-        await telegram_app.process_update(update)
+        # Responder a Telegram de inmediato y procesar el update fuera de la petición
+        telegram_app.update_queue.put_nowait(update)
         return {"status": "ok"}
+    except asyncio.QueueFull:
+        logger.warning("Cola de updates llena, rechazando update")
+        raise HTTPException(status_code=503, detail="Servicio saturado")
     except Exception as e:
         logger.exception("Error procesando webhook") # Changed to logger.exception
         raise HTTPException(status_code=500, detail="Error interno")
 
 @app.post("/send-test")
-async def send_test_message():
+async def send_test_message(request: Request):
     """Endpoint para enviar un mensaje de prueba"""
-    config = bot_manager._load_config()
-    configured_chat_ids = config.get('configured_chat_ids', [])
+    bot_manager: BotManager = request.app.state.bot_manager
+    configured_chat_ids = list(bot_manager.chat_ids)
     
     if not configured_chat_ids:
         raise HTTPException(status_code=400, detail="No hay chats configurados para enviar mensajes.")
     
-    conn = bot_manager._get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT fact_text FROM facts ORDER BY RANDOM() LIMIT 1")
-    fact_row = cursor.fetchone()
-    conn.close()
-
-    if not fact_row:
+    if not bot_manager._facts:
         raise HTTPException(status_code=400, detail="No hay curiosidades disponibles")
     
-    fact = fact_row['fact_text']
+    fact = random.choice(bot_manager._facts)
+    text = TEST_HEADER + fact + TEST_FOOTER
     
     for chat_id in configured_chat_ids:
         try:
+            await bot_manager._limiter.acquire(chat_id)
             await telegram_app.bot.send_message(
                 chat_id=chat_id,
-                text=f"🧪 **Mensaje de prueba**\n\n{fact}\n\n_✅ Bot funcionando correctamente_",
+                text=text,
                 parse_mode='Markdown'
             )
-            logger.info(f"Mensaje de prueba enviado al chat {chat_id}")
+            logger.info("Mensaje de prueba enviado al chat %s", chat_id)
         except Exception as e:
-            logger.error(f"Error enviando mensaje de prueba al chat {chat_id}: {e}")
+            logger.error("Error enviando mensaje de prueba al chat %s: %s", chat_id, e)
             
     return {"status": "success", "message": "Mensaje de prueba enviado a los chats configurados"}
 
 # Página HTML simple para ver el estado
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard():
-    config = bot_manager._load_config()
+async def dashboard(request: Request):
+    bot_manager: BotManager = request.app.state.bot_manager
+    cached = bot_manager._dashboard_html
+    if cached and monotonic() - cached[0] < DASHBOARD_CACHE_TTL:
+        return HTMLResponse(content=cached[1])
+
+    config = bot_manager.config
     
-    conn = bot_manager._get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM facts")
-    total_facts = cursor.fetchone()[0]
-    conn.close()
-
-    status = "🟢 ACTIVO" if config.get('active_chat_id') else "🔴 INACTIVO"
-    configured_chats_str = ", ".join(map(str, config.get('configured_chat_ids', []))) if config.get('configured_chat_ids') else "Ninguno"
-
-    html_content = f"""
-    <html>
-        <head>
-            <title>Dashboard - Bot de Curiosidades de C</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 40px; }}
-                .card {{ background: #f4f4f4; padding: 20px; margin: 10px 0; border-radius: 8px; }}
-                .active {{ color: green; }}
-                .inactive {{ color: red; }}
-            </style>
-        </head>
-        <body>
-            <h1>🤖 Dashboard - Bot de Curiosidades de C</h1>
-            
-            <div class="card">
-                <h2>Estado del Bot: <span class="{ 'active' if config.get('active_chat_id') else 'inactive' }" >{status}</span></h2>
-                <p><strong>Propietario ID:</strong> {config.get('owner_id', 'No configurado')}</p>
-                <p><strong>Chat ID Activo:</strong> {config.get('active_chat_id', 'No configurado')}</p>
-                <p><strong>Chats Configurados:</strong> {configured_chats_str}</p>
-                <p><strong>Fecha configuración:</strong> {config.get('setup_date', 'No configurado')}</p>
-                <p><strong>Curiosidades disponibles:</strong> {total_facts}</p>
-                <p><strong>Webhook:</strong> {'🟢 CONFIGURADO' if WEBHOOK_URL else '🔴 NO CONFIGURADO'}</p>
-            </div>
-            
-            <div class="card">
-                <h2>Acciones</h2>
-                <p><a href="/health">✅ Health Check</a></p>
-                <p><a href="/status">📊 Estado JSON</a></p>
-                <p><a href="/send-test">🧪 Enviar Mensaje de Prueba</a></p>
-            </div>
-        </body>
-    </html>
-    """
+    total_facts = len(bot_manager._facts)
+
+    is_active = bool(config.get('active_chat_id'))
+    configured_chats_str = ", ".join(map(str, sorted(bot_manager.chat_ids))) if bot_manager.chat_ids else "Ninguno"
+
+    html_content = _DASHBOARD_TMPL.substitute(
+        status_class='active' if is_active else 'inactive',
+        status="🟢 ACTIVO" if is_active else "🔴 INACTIVO",
+        owner_id=config.get('owner_id', 'No configurado'),
+        active_chat_id=config.get('active_chat_id', 'No configurado'),
+        configured_chats=configured_chats_str,
+        setup_date=config.get('setup_date', 'No configurado'),
+        total_facts=total_facts
+    )
+    bot_manager._dashboard_html = (monotonic(), html_content)
     return HTMLResponse(content=html_content)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
+    # Un solo worker: el lock file exige una única instancia del bot
+    uvicorn.run(app, host="0.0.0.0", port=PORT, loop="uvloop", http="httptools", log_level="info", workers=1)